@@ -1,16 +1,31 @@
 import datetime as dt
+import typing as t
 
-import more_itertools as miter
+import pandas as pd
 
 from src.code_mappings import BIRTHPLACE, HANDEDNESS, MOS, RACE, RANK
 
+F = t.TypeVar("F", bound=t.Callable)
 
-def weight(in_weight: int) -> float:
+
+def vectorized(func: F) -> F:
+    """
+    Mark the decorated converter as able to operate directly on a full `pd.Series`.
+
+    Vectorized converters are called once with the entire column rather than once per value.
+    """
+    func.vectorized = True  # type: ignore[attr-defined]
+    return func
+
+
+@vectorized
+def weight(in_weight: t.Union[int, pd.Series]) -> t.Union[float, pd.Series]:
     """Decode weight, assumed to be provided as weight * 10."""
     return in_weight / 10
 
 
-def age(in_age: int) -> float:
+@vectorized
+def age(in_age: t.Union[int, pd.Series]) -> t.Union[float, pd.Series]:
     """Decode age, assumed to be provided as age * 10."""
     return in_age / 10
 
@@ -69,8 +84,8 @@ def length_of_service(coded_los: int) -> int:
     """
     # Since the encoded length of service is cast to an integer, any leading zeros are lost so we
     # can pad the values to make sure we capture the correct duration
-    stringified = list(f"{coded_los:06}")
-    years, months, days = map(int, ("".join(chunk) for chunk in miter.chunked(stringified, 2)))
+    stringified = f"{coded_los:06}"
+    years, months, days = int(stringified[:2]), int(stringified[2:4]), int(stringified[4:])
 
     return (years * 365) + (months * 30) + days
 
@@ -79,8 +94,8 @@ def birth_date(coded_birthdate: int) -> dt.date:
     """Decode the provided birth date, assumed to be provided as `YYMMDD`."""
     # Left-pad the birthdate to account for birthdates before 1910
     # Probably unlikely but it's an easy guard
-    stringified = list(f"{coded_birthdate:06}")
-    year, month, day = ["".join(chunk) for chunk in miter.chunked(stringified, 2)]
+    stringified = f"{coded_birthdate:06}"
+    year, month, day = stringified[:2], stringified[2:4], stringified[4:]
 
     try:
         # Since this is 1970, we can safely add on the 1900s suffix before casting back to int
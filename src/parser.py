@@ -1,14 +1,28 @@
+import os
 import re
 import typing as t
 from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 
-import more_itertools as miter
+import numpy as np
 import pandas as pd
 
 from src import converters
 
 OUT_FILEPATH = Path("./converted_anthro_table.xlsx")
+LINE_WIDTH = 80
+
+# Variable names are typically truncated to a fixed width in the variable name table, with at least
+# 2 spaces between columns
+_NAME_WIDTH = 18
+_COL_SPLIT = re.compile(rb"\s{2,}")
+_SPEC_RE = re.compile(r"(\d*)(\w)(\d+)(?:\.\d*)?")
+
+# ASCII codes used when parsing raw data bytes
+_ZERO, _NINE, _BLANK, _PLUS, _MINUS = b"09 +-"
 
 CONVERTER_MAP = {
     "WEIGHT": converters.weight,
@@ -28,17 +42,18 @@ CONVERTER_MAP = {
 FieldSpec = namedtuple("FieldSpec", ["n_repeats", "type", "width"])
 
 
-def extract_variable_names(full_text: list[str]) -> tuple[list[str], str, int]:
+def extract_variable_names(full_text: list[bytes]) -> tuple[list[str], str, int]:
     """
     Extract the variable names from the provided data file.
 
-    `full_text` is assumed to be a list of strings generated by `str.splitlines()` on the data file.
+    `full_text` is assumed to be a list of bytes generated by `bytes.splitlines()` on the data file.
     The table is assumed to start at the beginning of the file and look something like the
     following:
         `   1  WEIGHT               86750  218000  132100  5000  3000   0453592  22046226`
 
     Each row corresponds to a data column; only the string is extracted, all other information is
-    ignored.
+    ignored. Names are assumed to occupy a fixed width field of 18 characters; if a name runs past
+    this width, the line is instead split on runs of 2 or more spaces to extract the full name.
 
     A `"SUBJECT ID"` varaible is prepended to the resulting list of names to account for the integer
     subject ID in the raw data table.
@@ -54,23 +69,29 @@ def extract_variable_names(full_text: list[str]) -> tuple[list[str], str, int]:
     var_names = ["SUBJECT ID"]
     for _idx, line in enumerate(full_text):  # pragma: no branch
         # Check if we've gotten to the data format spec
-        if line.strip().startswith("("):
+        if line.strip().startswith(b"("):
             break
 
-        # There should be at least 2 spaces between columns & we only care about column 2
-        # Leading whitespace is not significant here
-        split_line = re.split(r"\s{2,}", line.strip(), maxsplit=2)
-        var_names.append(split_line[1])
+        # We only care about column 2, which is a fixed width name field following the variable
+        # number; leading whitespace is not significant here
+        _, name_field = line.split(maxsplit=1)
+        name, overflow = name_field[:_NAME_WIDTH], name_field[_NAME_WIDTH:]
+        if overflow[:2].strip():
+            # Name is wider than the expected field, so fall back to splitting on the column gaps
+            name = _COL_SPLIT.split(line.strip(), maxsplit=2)[1]
 
-    format_spec = full_text[_idx].strip(" ()")
+        var_names.append(name.strip().decode("ascii"))
+
+    format_spec = full_text[_idx].decode("ascii").strip(" ()")
     data_start_idx = _idx + 1
 
     return var_names, format_spec, data_start_idx
 
 
-def parse_format_spec(raw_spec: str) -> tuple[list[FieldSpec], int]:
+@lru_cache(maxsize=32)
+def parse_format_spec(raw_spec: str) -> tuple[tuple[FieldSpec, ...], int]:
     """
-    Parse the provided format specifier into a list of its field specifications.
+    Parse the provided format specifier into a tuple of its field specifications.
 
     The raw format specifier is assumed to be of the following form:
         <n repeats><type><width>.<decimal width>
@@ -87,32 +108,117 @@ def parse_format_spec(raw_spec: str) -> tuple[list[FieldSpec], int]:
 
     NOTE: All currently encountered data specifies 0 decimal digits so the decimal width specifier
     is ignored.
+
+    NOTE: Format specifiers are typically shared across files, so parsed results are cached
     """
     chunk_size = raw_spec.count("/") + 1
 
-    # Format spec should be received without whitespace or parentheses, but do it again as a guard
-    fields = re.split(r"[,/]", raw_spec.strip(" ()"))
-    spec_pattern = r"(\d*)(\w)(\d+)\.?"
-    matches = []
-    for field in fields:
-        match = re.search(spec_pattern, field)
+    # Specifiers are self-delimiting, so they can be pulled directly out of the raw spec without
+    # splitting it up first
+    # The decimal width is consumed by the pattern so it can't be mistaken for another specifier
+    # Anything between specifiers other than a single delimiter is an unknown field specifier
+    spec = raw_spec.strip(" ()")
+    field_specs = []
+    last_end = 0
+    for match in _SPEC_RE.finditer(spec):
+        match_start, match_end = match.span()
+        separator = spec[last_end:match_start]
+        if separator not in ({""} if last_end == 0 else {",", "/"}):
+            raise ValueError(f"Unknown field specifier: '{separator.strip(',/')}'")
+
+        n_repeats, field_type, field_width = match.groups()
+        field_specs.append(
+            FieldSpec(int(n_repeats) if n_repeats else 1, field_type, int(field_width))
+        )
+        last_end = match_end
 
-        if not match:
-            raise ValueError(f"Unknown field specifier: '{field}'")
+    if spec[last_end:]:
+        raise ValueError(f"Unknown field specifier: '{spec[last_end:].strip(',/')}'")
 
-        matches.append(match.groups())
+    if not field_specs:
+        raise ValueError(f"No field specifiers found in format spec: '{raw_spec}'")
 
-    field_specs = []
-    for n_repeats, field_type, field_width in matches:
-        field_specs.append(
-            FieldSpec(
-                int(n_repeats) if n_repeats else 1,
-                field_type,
-                int(field_width),
+    return tuple(field_specs), chunk_size
+
+
+def calculate_field_bounds(raw_spec: str, line_width: int = LINE_WIDTH) -> list[tuple[int, int]]:
+    """
+    Calculate the `(start, end)` character bounds of each field in one row of data.
+
+    See `parse_format_spec` for the assumed format of the raw format specifier. Each forward slash
+    in the specifier starts a new line, so field offsets restart at the beginning of the next line.
+    Bounds are relative to the logical row built by padding each of its lines to `line_width`
+    characters and joining them together.
+
+    A `ValueError` is raised if the fields specified for any one line don't fit within `line_width`.
+    """
+    bounds = []
+    for line_idx, line_spec in enumerate(raw_spec.strip(" ()").split("/")):
+        offset = line_idx * line_width
+        field_specs, _ = parse_format_spec(line_spec)
+        for field in field_specs:
+            for _ in range(field.n_repeats):
+                bounds.append((offset, offset + field.width))
+                offset += field.width
+
+        if offset > (line_idx + 1) * line_width:
+            raise ValueError(
+                f"Fields specified for line {line_idx + 1} exceed the {line_width} character line "
+                f"width: '{line_spec}'"
             )
-        )
 
-    return field_specs, chunk_size
+    return bounds
+
+
+def _parse_rows_int(buf: np.ndarray, bounds: list[tuple[int, int]]) -> np.ndarray:
+    """
+    Parse the integer fields at the provided bounds out of a 2D array of ASCII bytes.
+
+    Each row of `buf` is assumed to contain one row of data. Fields are parsed across all rows at
+    once; leading & trailing blanks are ignored and a single sign may precede the digits.
+
+    Fields are parsed in one shot by weighting each digit by its place value; trailing blanks are
+    then divided back out so they aren't counted as zeros.
+
+    Parsed values are returned column-wise, with one row of the output array per field.
+
+    A `ValueError` is raised if any field contains non-numeric data, a misplaced sign, blanks inside
+    its value (e.g. a misaligned row), or no digits at all (e.g. a missing measurement).
+    """
+    # Preallocate the output column-wise so each parsed field is written to a contiguous block that
+    # can be handed directly to pandas
+    parsed = np.empty((len(bounds), len(buf)), dtype=np.int64)
+    for col_idx, (start, end) in enumerate(bounds):
+        field = buf[:, start:end].astype(np.int64)
+
+        is_digit = (field >= _ZERO) & (field <= _NINE)
+        is_blank = field == _BLANK
+        is_sign = (field == _PLUS) | (field == _MINUS)
+        if not (is_digit | is_blank | is_sign).all():
+            raise ValueError(f"Non-numeric data found in field spanning columns {start}-{end}")
+
+        if not is_digit.any(axis=1).all():
+            raise ValueError(f"Field spanning columns {start}-{end} is missing data")
+
+        # A sign is only allowed as the first non-blank character of the field
+        follows_nonblank = np.logical_or.accumulate(~is_blank, axis=1)
+        if (is_sign[:, 1:] & follows_nonblank[:, :-1]).any():
+            raise ValueError(f"Misplaced sign found in field spanning columns {start}-{end}")
+
+        # Blanks are only allowed as padding around the field's value
+        precedes_nonblank = np.logical_or.accumulate(~is_blank[:, ::-1], axis=1)[:, ::-1]
+        if (is_blank & follows_nonblank & precedes_nonblank).any():
+            raise ValueError(f"Embedded blank found in field spanning columns {start}-{end}")
+
+        digits = np.where(is_digit, field - _ZERO, 0)
+        place_values = 10 ** np.arange(end - start - 1, -1, -1, dtype=np.int64)
+        n_trailing_blanks = (is_blank & ~precedes_nonblank).sum(axis=1)
+        magnitudes = (digits @ place_values) // 10**n_trailing_blanks
+
+        is_negative = (field == _MINUS).any(axis=1)
+        parsed[col_idx] = np.where(is_negative, -magnitudes, magnitudes)
+
+    return parsed
 
 
 def do_inplace_conversions(
@@ -123,22 +229,42 @@ def do_inplace_conversions(
 
     If the variable is not present in the provided DataFrame, the conversion is ignored.
 
+    Converters marked as vectorized (see `converters.vectorized`) are applied to the entire column
+    at once. Coded variables tend to have very few distinct values, so all other converters are only
+    called once per unique value in their column. String columns with few distinct values relative
+    to their length are converted to the `category` dtype.
+
     NOTE: Mapped variable names are case-sensitive
     """
     for var_name, converter in converter_mapping.items():
         try:
-            parsed_df[var_name] = parsed_df[var_name].apply(converter)
+            col = parsed_df[var_name]
         except KeyError:
             continue
 
+        if getattr(converter, "vectorized", False):
+            parsed_df[var_name] = converter(col)
+            continue
+
+        lut = {val: converter(val) for val in col.unique()}
+        converted = col.map(lut)
+
+        # Store low cardinality string columns as categoricals, rather than repeating each value per
+        # row; numeric & date outputs are left as-is so they can still be operated on
+        is_string = pd.api.types.infer_dtype(converted, skipna=True) == "string"
+        if is_string and converted.nunique() < len(converted) // 10:
+            converted = converted.astype("category")
+
+        parsed_df[var_name] = converted
+
     return parsed_df
 
 
-def parse_data(full_text: list[str]) -> pd.DataFrame:
+def parse_data(full_text: list[bytes]) -> pd.DataFrame:
     """
     Helper pipeline to parse the provided data file into a Pandas DataFrame.
 
-    `full_text` is assumed to be a list of strings generated by `str.splitlines()` on the data file.
+    `full_text` is assumed to be a list of bytes generated by `bytes.splitlines()` on the data file.
     The table is assumed to start at the beginning of the file and look something like the
     following:
         ```
@@ -151,47 +277,91 @@ def parse_data(full_text: list[str]) -> pd.DataFrame:
     subject ID.
     """
     var_names, format_spec, data_start_idx = extract_variable_names(full_text)
-    field_specs, chunk_size = parse_format_spec(format_spec)
+    _, chunk_size = parse_format_spec(format_spec)
+    bounds = calculate_field_bounds(format_spec)
+    if len(var_names) != len(bounds):
+        raise ValueError(
+            f"Number of variable names ({len(var_names)}) does not match the number of fields "
+            f"specified by the format spec ({len(bounds)})"
+        )
 
-    parsed_rows = []
-    for chunk in miter.chunked(full_text[data_start_idx:], chunk_size):
-        parsed_row = []
+    # Trailing blank lines aren't data, but every other row of data must be complete
+    data_lines = full_text[data_start_idx:]
+    while data_lines and not data_lines[-1].strip():
+        data_lines = data_lines[:-1]
 
-        # Trailing whitespace is just padding to get to 80 characters for the line
-        # Dump row into a deque so we can pop off the leading digits as we read
-        row = deque("".join(chunk).rstrip())
-        for field in field_specs:
-            for _ in range(field.n_repeats):
-                parsed_row.append(int("".join(row.popleft() for _ in range(field.width))))
+    if len(data_lines) % chunk_size:
+        raise ValueError(
+            f"Incomplete row of data: {len(data_lines)} data lines is not a multiple of the "
+            f"{chunk_size} lines per row"
+        )
 
-        parsed_rows.append(parsed_row)
+    # Pad (or trim) each line to the full line width so every row of data spans the same number of
+    # characters, then view the data as a 2D array of bytes with one row per subject
+    row_width = chunk_size * LINE_WIDTH
+    n_rows = len(data_lines) // chunk_size
+    data = b"".join(line[:LINE_WIDTH].ljust(LINE_WIDTH) for line in data_lines)
+    buf = np.frombuffer(data, dtype=np.uint8)
 
-    parsed_df = pd.DataFrame(parsed_rows, columns=var_names).set_index("SUBJECT ID")
+    # Subject ID is always the first field, so it can be used as the index directly rather than
+    # building the DataFrame & then moving the column into the index
+    # Parsed data is column-wise, so its transpose is a view that pandas can use as a block as-is
+    parsed = _parse_rows_int(buf.reshape(n_rows, row_width), bounds)
+    subject_ids = pd.Index(parsed[0], name=var_names[0])
+    parsed_df = pd.DataFrame(parsed[1:].T, columns=var_names[1:], index=subject_ids, copy=False)
 
     return parsed_df
 
 
+def _parse_file(filepath: Path, inplace_decoding: bool) -> pd.DataFrame:
+    """Parse the provided data file, optionally decoding complex fields in-place."""
+    # Data files are plain ASCII, so there's no need to decode the full file into strings
+    full_text = filepath.read_bytes().splitlines()
+
+    if inplace_decoding:
+        return do_inplace_conversions(parse_data(full_text))
+    else:
+        return parse_data(full_text)
+
+
 def batch_parse(
     file_list: dict[str, Path], out_filepath: Path = OUT_FILEPATH, inplace_decoding: bool = True
-) -> None:  # pragma: no cover
+) -> None:
     """
     Batch parse the provided files into an Excel spreadsheet.
 
     `file_list` is assumed to be a dictionary mapping the desired sheet name to its corresponding
-    data file.
+    data file. Files are parsed in parallel across processes and each parsed sheet is written out as
+    soon as it's available. At most one file per worker process is queued ahead of the sheet being
+    written, so parsed files don't pile up in memory while waiting on the spreadsheet writes.
+
+    The spreadsheet is written to a temporary file alongside `out_filepath` & only moved into place
+    once every file has been parsed & written, so a failed parse won't clobber an existing output.
 
     The `inplace_decoding` flag can be set to decode complex fields (e.g. MOS, Age, Rank) in-place
     in the parsed dataframe. Decoding is done by default.
     """
-    raw_dfs = {}
-    for file_key, filepath in file_list.items():
-        full_text = filepath.read_text().splitlines()
-
-        if inplace_decoding:
-            raw_dfs[file_key] = do_inplace_conversions(parse_data(full_text))
-        else:
-            raw_dfs[file_key] = parse_data(full_text)
-
-    with pd.ExcelWriter(out_filepath) as writer:
-        for file_id, df in raw_dfs.items():
-            df.to_excel(writer, sheet_name=file_id)
+    n_workers = os.cpu_count() or 1
+    tmp_filepath = out_filepath.with_name(f"{out_filepath.stem}.partial{out_filepath.suffix}")
+    to_parse = iter(file_list.items())
+    try:
+        with ProcessPoolExecutor(n_workers) as executor, pd.ExcelWriter(tmp_filepath) as writer:
+            pending = deque(
+                (file_id, executor.submit(_parse_file, filepath, inplace_decoding))
+                for file_id, filepath in islice(to_parse, n_workers)
+            )
+            while pending:
+                file_id, future = pending.popleft()
+                parsed_df = future.result()
+
+                # Queue up the next file before writing so the workers stay busy
+                for next_file_id, next_filepath in islice(to_parse, 1):
+                    next_future = executor.submit(_parse_file, next_filepath, inplace_decoding)
+                    pending.append((next_file_id, next_future))
+
+                parsed_df.to_excel(writer, sheet_name=file_id)
+    except BaseException:
+        tmp_filepath.unlink(missing_ok=True)
+        raise
+
+    tmp_filepath.replace(out_filepath)
@@ -1,5 +1,7 @@
 import datetime as dt
+import typing as t
 
+import pandas as pd
 import pytest
 
 from src import converters
@@ -15,6 +17,16 @@ def test_age_converter() -> None:
     assert converters.age(314) == pytest.approx(31.4)
 
 
+@pytest.mark.parametrize("converter", (converters.weight, converters.age))
+def test_vectorized_converter(converter: t.Callable) -> None:
+    """Vectorized converters should give the same result for a Series as for each of its values."""
+    values = pd.Series([3141, 314, 0])
+    truth = pd.Series([converter(val) for val in values])
+
+    assert getattr(converter, "vectorized", False)
+    pd.testing.assert_series_equal(converter(values), truth)
+
+
 def test_race_converter() -> None:
     """Check a randomly selected mapping & fallback to empty string on unavialable key."""
     assert converters.race(2) == "BLACK"
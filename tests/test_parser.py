@@ -1,3 +1,4 @@
+from pathlib import Path
 from textwrap import dedent
 
 import pandas as pd
@@ -35,6 +36,20 @@ VARIABLE_PARSING_CASES = (
         "I4,19F4.0",
         7,
     ),
+    # Names wider than the usual 18 character field should be extracted whole
+    (
+        dedent(
+            """\
+             1  SHOULDER-ELBOW LENGTH   29750   55500   42000  1000  1000   1000000   3937008
+             2  ACROMION HEIGHT SIT   29750   55500   42000  1000  1000   1000000   3937008
+             3  STATURE             141750  183800  163000  1500  1000   1000000   3937008
+             (I4,3F4.0)
+            """
+        ),
+        ["SUBJECT ID", "SHOULDER-ELBOW LENGTH", "ACROMION HEIGHT SIT", "STATURE"],
+        "I4,3F4.0",
+        4,
+    ),
 )
 
 
@@ -50,7 +65,7 @@ def test_variable_name_extraction(
     The closing line of a test case source must contain a format spec, as this triggers the parser
     to stop looking for variable names; it does not have to match the shape of the test case data.
     """
-    split_src = text_src.splitlines()
+    split_src = text_src.encode().splitlines()
     # Ignore the format spec & data start index
     var_names, format_spec, data_start_idx = parser.extract_variable_names(split_src)
 
@@ -62,19 +77,21 @@ def test_variable_name_extraction(
 # Provide (format spec, truth fields, truth chunk size) test case tuples
 FORMAT_SPEC_CASES = (
     # Format spec should be received without whitespace or parentheses, but there is a guard
-    ("I4", [FieldSpec(1, "I", 4)], 1),
-    ("19F4.0", [FieldSpec(19, "F", 4)], 1),
-    ("I4,19F4.0", [FieldSpec(1, "I", 4), FieldSpec(19, "F", 4)], 1),
-    ("I4,19F4.0/20F4.0", [FieldSpec(1, "I", 4), FieldSpec(19, "F", 4), FieldSpec(20, "F", 4)], 2),
+    ("I4", (FieldSpec(1, "I", 4),), 1),
+    ("19F4.0", (FieldSpec(19, "F", 4),), 1),
+    ("I4,19F4.0", (FieldSpec(1, "I", 4), FieldSpec(19, "F", 4)), 1),
+    ("I4,19F4.0/20F4.0", (FieldSpec(1, "I", 4), FieldSpec(19, "F", 4), FieldSpec(20, "F", 4)), 2),
+    # Decimal widths should not be mistaken for another specifier
+    ("F4.12,I2", (FieldSpec(1, "F", 4), FieldSpec(1, "I", 2)), 1),
     # Check parentheses/whitespace stripping
-    ("(I4)", [FieldSpec(1, "I", 4)], 1),
-    (" (I4)   ", [FieldSpec(1, "I", 4)], 1),
+    ("(I4)", (FieldSpec(1, "I", 4),), 1),
+    (" (I4)   ", (FieldSpec(1, "I", 4),), 1),
 )
 
 
 @pytest.mark.parametrize(("spec_src", "truth_spec", "truth_chunk_size"), FORMAT_SPEC_CASES)
 def test_format_spec_parsing(  # noqa: D103
-    spec_src: str, truth_spec: list[FieldSpec], truth_chunk_size: int
+    spec_src: str, truth_spec: tuple[FieldSpec, ...], truth_chunk_size: int
 ) -> None:
     field_specs, chunk_size = parser.parse_format_spec(spec_src)
 
@@ -87,10 +104,38 @@ def test_empty_format_spec_raises() -> None:  # noqa: D103
         parser.parse_format_spec("")
 
 
+@pytest.mark.parametrize("spec_src", ("I4,2X,F4.0", "I4,garbage,F4.0", "I4,,F4.0", "XI4", "I4X"))
+def test_unknown_format_spec_raises(spec_src: str) -> None:  # noqa: D103
+    with pytest.raises(ValueError, match="Unknown field specifier"):
+        parser.parse_format_spec(spec_src)
+
+
+# Provide (format spec, truth bounds) test case tuples
+FIELD_BOUNDS_CASES = (
+    ("I4", [(0, 4)]),
+    ("I4,2F3.0", [(0, 4), (4, 7), (7, 10)]),
+    ("I4,F4.0/F4.0", [(0, 4), (4, 8), (80, 84)]),
+    (" (I4/F4.0/2F2.0)   ", [(0, 4), (80, 84), (160, 162), (162, 164)]),
+)
+
+
+@pytest.mark.parametrize(("spec_src", "truth_bounds"), FIELD_BOUNDS_CASES)
+def test_field_bounds(spec_src: str, truth_bounds: list[tuple[int, int]]) -> None:
+    """Field offsets should restart at the beginning of each line spanned by a row of data."""
+    assert parser.calculate_field_bounds(spec_src) == truth_bounds
+
+
+@pytest.mark.parametrize("spec_src", ("I4,20F4.0", "I4,F4.0/21F4.0"))
+def test_field_bounds_line_overflow_raises(spec_src: str) -> None:  # noqa: D103
+    with pytest.raises(ValueError, match="line width"):
+        parser.calculate_field_bounds(spec_src)
+
+
 # Provide a sample data dictionary for DataFrame creation
 # Should have at least one column that will be converted & at least one that will be ignored
-PARSED_DATAFRAME = pd.DataFrame(data={"WEIGHT": [3141], "SNEK": [1337]})
-TRUTH_DATAFRAME = pd.DataFrame(data={"WEIGHT": [314.1], "SNEK": [1337]})
+# Should also have at least one vectorized converter & at least one lookup converter
+PARSED_DATAFRAME = pd.DataFrame(data={"WEIGHT": [3141], "RACE": [2], "SNEK": [1337]})
+TRUTH_DATAFRAME = pd.DataFrame(data={"WEIGHT": [314.1], "RACE": ["BLACK"], "SNEK": [1337]})
 
 
 def test_inplace_converstion() -> None:
@@ -99,6 +144,31 @@ def test_inplace_converstion() -> None:
     assert converted.equals(TRUTH_DATAFRAME)
 
 
+def test_low_cardinality_conversion_categorical() -> None:
+    """Only low cardinality string columns should be converted to categoricals."""
+    parsed_df = pd.DataFrame(
+        data={
+            "WEIGHT": [3141] * 30,
+            "RACE": [1, 2] * 15,
+            "LENGHT OF SERVICE": [10101, 20202] * 15,
+            "BIRTH DATE": [500101, 510202] * 15,
+        }
+    )
+    converted = parser.do_inplace_conversions(parsed_df)
+
+    assert converted["RACE"].dtype == "category"
+    assert converted["WEIGHT"].dtype == "float64"
+    assert converted["LENGHT OF SERVICE"].dtype == "int64"
+    assert converted["BIRTH DATE"].dtype == "object"
+
+
+def test_high_cardinality_conversion_not_categorical() -> None:  # noqa: D103
+    parsed_df = pd.DataFrame(data={"RACE": [1, 2, 3] * 10})
+    converted = parser.do_inplace_conversions(parsed_df)
+
+    assert converted["RACE"].dtype != "category"
+
+
 # Provide (sample data file, resulting dataframe) test case tuples
 # Data file source should contain variable headers, format spec, and at least one row of data
 DATA_PARSING_CASES = (
@@ -125,12 +195,158 @@ DATA_PARSING_CASES = (
         ),
         pd.DataFrame(data={"SUBJECT ID": [5048], "A": [2313], "B": [857]}).set_index("SUBJECT ID"),
     ),
+    (
+        dedent(
+            """\
+            1  A
+            2  B
+            (I4,2F4.0)
+            5048 -23  +8
+            """
+        ),
+        pd.DataFrame(data={"SUBJECT ID": [5048], "A": [-23], "B": [8]}).set_index("SUBJECT ID"),
+    ),
+    (
+        dedent(
+            """\
+            1  A
+            2  B
+            (I4,2F4.0)
+            504885   857
+            """
+        ),
+        pd.DataFrame(data={"SUBJECT ID": [5048], "A": [85], "B": [857]}).set_index("SUBJECT ID"),
+    ),
 )
 
 
 @pytest.mark.parametrize(("full_src", "truth_df"), DATA_PARSING_CASES)
 def test_data_parsing(full_src: str, truth_df: pd.DataFrame) -> None:  # noqa: D103
-    full_text = full_src.splitlines()
+    full_text = full_src.encode().splitlines()
     parsed_df = parser.parse_data(full_text)
 
     assert parsed_df.equals(truth_df)
+
+
+def test_padded_multirow_data_parsing() -> None:
+    """Rows are sliced out of a single buffer, so line padding must not shift subsequent rows."""
+    full_text = [
+        b"1  A",
+        b"2  B",
+        b"(I4,F4.0/F4.0)",
+        b"50482313" + b" " * 72,
+        b" 857" + b" " * 80,
+        b"50491234",
+        b"  42",
+    ]
+    truth_df = pd.DataFrame(
+        data={"SUBJECT ID": [5048, 5049], "A": [2313, 1234], "B": [857, 42]}
+    ).set_index("SUBJECT ID")
+
+    assert parser.parse_data(full_text).equals(truth_df)
+
+
+# Provide data lines that should be rejected by the parser
+# Each case is parsed with the `(I4,F4.0)` format spec
+INVALID_DATA_CASES = (
+    [b"5048 ABC"],  # Non-numeric data
+    [b"5048    "],  # Missing measurement
+    [b"5048 1-2"],  # Sign after a digit
+    [b"5048 --2"],  # Multiple signs
+    [b"5048 1 2"],  # Embedded blank
+    [b"5048- 2 "],  # Blank between sign & digits
+)
+
+
+@pytest.mark.parametrize("data_lines", INVALID_DATA_CASES)
+def test_invalid_data_raises(data_lines: list[bytes]) -> None:  # noqa: D103
+    full_text = [b"1  A", b"(I4,F4.0)", *data_lines]
+
+    with pytest.raises(ValueError):
+        parser.parse_data(full_text)
+
+
+def test_field_count_mismatch_raises() -> None:  # noqa: D103
+    full_text = [b"1  A", b"2  B", b"(I4,3F4.0)", b"5048   1   2   3"]
+
+    with pytest.raises(ValueError, match="Number of variable names"):
+        parser.parse_data(full_text)
+
+
+def test_duplicate_variable_names_kept() -> None:  # noqa: D103
+    full_text = [b"1  A", b"2  A", b"(I4,2F4.0)", b"5048   1   2"]
+    parsed_df = parser.parse_data(full_text)
+
+    assert list(parsed_df.columns) == ["A", "A"]
+    assert parsed_df.iloc[0].tolist() == [1, 2]
+
+
+def test_incomplete_row_raises() -> None:  # noqa: D103
+    full_text = [b"1  A", b"2  B", b"(I4,F4.0/F4.0)", b"50481234", b" 857", b"50491234"]
+
+    with pytest.raises(ValueError, match="Incomplete row"):
+        parser.parse_data(full_text)
+
+
+def test_trailing_blank_lines_ignored() -> None:  # noqa: D103
+    full_text = [b"1  A", b"(I4,F4.0)", b"50481234", b"", b"    "]
+    truth_df = pd.DataFrame(data={"SUBJECT ID": [5048], "A": [1234]}).set_index("SUBJECT ID")
+
+    assert parser.parse_data(full_text).equals(truth_df)
+
+
+# Provide (inplace decoding flag, resulting dataframe) test case tuples
+PARSE_FILE_CASES = (
+    (False, pd.DataFrame(data={"SUBJECT ID": [5048], "WEIGHT": [3141]}).set_index("SUBJECT ID")),
+    (True, pd.DataFrame(data={"SUBJECT ID": [5048], "WEIGHT": [314.1]}).set_index("SUBJECT ID")),
+)
+
+
+@pytest.mark.parametrize(("inplace_decoding", "truth_df"), PARSE_FILE_CASES)
+def test_parse_file(  # noqa: D103
+    tmp_path: Path, inplace_decoding: bool, truth_df: pd.DataFrame
+) -> None:
+    data_file = tmp_path / "data.txt"
+    data_file.write_bytes(b"   1  WEIGHT\n (I4,F4.0)\n50483141\n")
+
+    assert parser._parse_file(data_file, inplace_decoding).equals(truth_df)
+
+
+def test_batch_parse(tmp_path: Path) -> None:
+    """Each data file should be written to its own sheet in the output spreadsheet."""
+    file_list = {
+        "FIRST": tmp_path / "first.txt",
+        "SECOND": tmp_path / "second.txt",
+    }
+    file_list["FIRST"].write_bytes(b"   1  WEIGHT\n (I4,F4.0)\n50483141\n")
+    file_list["SECOND"].write_bytes(b"   1  WEIGHT\n (I4,F4.0)\n50491234\n50501000\n")
+
+    out_filepath = tmp_path / "out.xlsx"
+    parser.batch_parse(file_list, out_filepath)
+
+    sheets = pd.read_excel(out_filepath, sheet_name=None, index_col="SUBJECT ID")
+    assert list(sheets) == ["FIRST", "SECOND"]
+    assert sheets["FIRST"]["WEIGHT"].to_dict() == {5048: pytest.approx(314.1)}
+    assert sheets["SECOND"]["WEIGHT"].to_dict() == {
+        5049: pytest.approx(123.4),
+        5050: pytest.approx(100.0),
+    }
+
+
+def test_batch_parse_failure_keeps_existing_output(tmp_path: Path) -> None:
+    """A failed parse should leave any existing output untouched & clean up its partial output."""
+    file_list = {
+        "GOOD": tmp_path / "good.txt",
+        "BAD": tmp_path / "bad.txt",
+    }
+    file_list["GOOD"].write_bytes(b"   1  WEIGHT\n (I4,F4.0)\n50483141\n")
+    file_list["BAD"].write_bytes(b"   1  WEIGHT\n (I4,F4.0)\n5048 ABC\n")
+
+    out_filepath = tmp_path / "out.xlsx"
+    out_filepath.write_bytes(b"existing output")
+
+    with pytest.raises(ValueError):
+        parser.batch_parse(file_list, out_filepath)
+
+    assert out_filepath.read_bytes() == b"existing output"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["bad.txt", "good.txt", "out.xlsx"]